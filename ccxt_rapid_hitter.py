@@ -1,97 +1,35 @@
-import ccxt
-import time
 import asyncio
+import sys
 from datetime import datetime
+from collections import defaultdict
 import aiohttp
+from tester_common import IndodaxTradeTester, format_wall_ns, make_session, results_path, warm_up, write_results
 
-class IndodaxRateLimitTester:
-    def __init__(self, api_key, secret_key):
-        self.exchange = ccxt.indodax({
-            'apiKey': api_key,
-            'secret': secret_key,
-            'enableRateLimit': False  # We'll handle rate limiting manually
-        })
-        
-    async def send_trade_request(self, pair, request_id):
-        # Prepare minimal trade parameters
-        request_timestamp = datetime.now()
-        start_time = time.time()
-        
-        try:
-            # Create a minimal limit order
-            params = {
-                'type': 'limit',
-                'client_order_id': f'test_{request_id}'  # Added client_order_id support
-            }
-            
-            result = await self.exchange.create_order(
-                symbol=pair,
-                type='limit',
-                side='buy',
-                amount=0.00001,  # Minimal amount
-                price=50000000000,  # Very low price to avoid execution
-                params=params
-            )
-            
-            end_time = time.time()
-            return {
-                'request_id': request_id,
-                'pair': pair,
-                'status': 200,  # Successful API call
-                'response': result,
-                'time': end_time - start_time,
-                'timestamp': request_timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')
-            }
-            
-        except ccxt.NetworkError as e:
-            end_time = time.time()
-            return {
-                'request_id': request_id,
-                'pair': pair,
-                'status': 'network_error',
-                'response': str(e),
-                'time': end_time - start_time,
-                'timestamp': request_timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')
-            }
-        except ccxt.ExchangeError as e:
-            end_time = time.time()
-            return {
-                'request_id': request_id,
-                'pair': pair,
-                'status': 'exchange_error',
-                'response': str(e),
-                'time': end_time - start_time,
-                'timestamp': request_timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')
-            }
-        except Exception as e:
-            end_time = time.time()
-            return {
-                'request_id': request_id,
-                'pair': pair,
-                'status': 'error',
-                'response': str(e),
-                'time': end_time - start_time,
-                'timestamp': request_timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')
-            }
+# Talks to the tapi endpoint directly instead of going through ccxt, so
+# per-request overhead doesn't skew the timing measurements
+class IndodaxRateLimitTester(IndodaxTradeTester):
+    base_url = "https://btcapi.net/tapi"
 
-    async def run_pair_requests(self, pair, requests_per_pair, start_id):
-        results = []
-        for i in range(requests_per_pair):
-            request_id = start_id + i
-            result = await self.send_trade_request(pair, request_id)
-            results.append(result)
-            if i < requests_per_pair - 1:  # Don't sleep after the last request
-                await asyncio.sleep(0.060)  # 60ms interval
-        return results
+    def _make_body_fmt(self, pair):
+        base_currency = pair.split('_')[0]
+        # Very low price to avoid execution, minimal amount
+        return (f"method=trade&recvWindow=5000&pair={pair}&type=buy"
+                f"&price=50000000000&order_type=limit&{base_currency}=0.00001"
+                "&timestamp={ts}&client_order_id=test_{request_id}")
 
-    async def run_rate_limit_test(self, pairs, requests_per_pair):
-        tasks = [
-            self.run_pair_requests(pair, requests_per_pair, i * requests_per_pair)
-            for i, pair in enumerate(pairs)
-        ]
-        
-        all_results = await asyncio.gather(*tasks)
-        return [item for sublist in all_results for item in sublist]
+    def _build_row(self, row, response, result, wait):
+        # tapi reports failed calls as {"success": 0, "error": ...} with a 200,
+        # which ccxt raised as an ExchangeError; keep classifying them that way
+        if row['status'] == 200 and isinstance(result, dict) and result.get('success') != 1:
+            row['status'] = 'exchange_error'
+        return row
+
+    def _error_status(self, exc):
+        return 'network_error' if isinstance(exc, aiohttp.ClientConnectionError) else 'error'
+
+    async def run_rate_limit_test(self, session, pairs, requests_per_pair):
+        await warm_up(session, self.base_url)
+        return await self._dispatch(session, pairs, requests_per_pair)
 
 async def main():
     # Replace with your API credentials
@@ -99,44 +37,58 @@ async def main():
     secret_key = "YOUR_SECRET_KEY"
 
     # Test parameters
-    pairs = ['BTC/IDR', 'ETH/IDR']  # CCXT uses standard market symbols
+    pairs = ['btc_idr', 'eth_idr']  # tapi uses lowercase pair ids
     requests_per_pair = 60  # Number of requests per pair
 
-    tester = IndodaxRateLimitTester(api_key, secret_key)
+    # Results are streamed to disk as they complete
+    results_file = results_path('ccxt_rapid_hitter')
+    writer_q = asyncio.Queue()
+    writer_task = asyncio.create_task(write_results(writer_q, results_file))
+
+    tester = IndodaxRateLimitTester(api_key, secret_key, results_queue=writer_q)
     
     print(f"Starting rate limit test at {datetime.now()}")
     print(f"Testing {len(pairs)} pairs with {requests_per_pair} requests each")
     print("Pairs:", pairs)
     print("-" * 50)
 
-    results = await tester.run_rate_limit_test(pairs, requests_per_pair)
+    try:
+        async with make_session() as session:
+            results = await tester.run_rate_limit_test(session, pairs, requests_per_pair)
+    finally:
+        await writer_q.put(None)
+        await writer_task
+    print(f"Results written to {results_file}")
 
     # Analyze results
+    # Group results by pair in a single pass; each bucket stays in dispatch order
+    by_pair = defaultdict(lambda: {'ok': [], 'err': []})
+    for r in results:
+        by_pair[r['pair']]['ok' if r['status'] == 200 else 'err'].append(r)
+
     for pair in pairs:
-        pair_results = [r for r in results if r['pair'] == pair]
-        success = len([r for r in pair_results if r['status'] == 200])
-        errors = len(pair_results) - success
+        bucket = by_pair[pair]
         
         print(f"\nResults for {pair}:")
-        print(f"Successful requests: {success}")
-        print(f"Failed requests: {errors}")
-        
-        # Sort results by request_id for chronological order
-        pair_results.sort(key=lambda x: x['request_id'])
+        print(f"Successful requests: {len(bucket['ok'])}")
+        print(f"Failed requests: {len(bucket['err'])}")
         
         # Print successful responses
-        success_responses = [r for r in pair_results if r['status'] == 200]
-        if success_responses:
+        if bucket['ok']:
             print("\nSuccess responses:")
-            for s in success_responses:
-                print(f"Request {s['request_id']} at {s['timestamp']}: {s['response']}")
+            for s in bucket['ok']:
+                print(f"Request {s['request_id']} at {format_wall_ns(s['t_wall_start'])}: {s['response']}")
         
         # Print error responses
-        error_responses = [r for r in pair_results if r['status'] != 200]
-        if error_responses:
+        if bucket['err']:
             print("\nError responses:")
-            for err in error_responses:
-                print(f"Request {err['request_id']} at {err['timestamp']}: {err['response']}")
+            for err in bucket['err']:
+                print(f"Request {err['request_id']} at {format_wall_ns(err['t_wall_start'])}: {err['response']}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if sys.platform.startswith('win'):
+        asyncio.run(main())
+    else:
+        # uvloop's lower scheduling overhead helps the pacer hold its 60ms cadence
+        import uvloop
+        uvloop.run(main())
\ No newline at end of file
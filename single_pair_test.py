@@ -1,106 +1,54 @@
-import hmac
-import time
-import hashlib
 import asyncio
-import aiohttp
-from urllib.parse import urlencode
+import sys
 from datetime import datetime
+from tester_common import IndodaxTradeTester, format_wall_ns, make_session, results_path, warm_up, queue_result, write_results
 
-class IndodaxSinglePairTester:
-    def __init__(self, api_key, secret_key):
-        self.api_key = api_key
-        self.secret_key = secret_key.encode()
-        self.base_url = "https://indodax.com/tapi"
+class IndodaxSinglePairTester(IndodaxTradeTester):
+    base_url = "https://indodax.com/tapi"
 
-    def _generate_signature(self, params):
-        encoded_params = urlencode(params)
-        signature = hmac.new(self.secret_key, encoded_params.encode(), hashlib.sha512)
-        return signature.hexdigest()
+    def __init__(self, api_key, secret_key, results_queue=None):
+        super().__init__(api_key, secret_key, results_queue=results_queue)
 
-    async def send_trade_request(self, session, pair, request_id):
+    def _make_body_fmt(self, pair):
         base_currency = pair.split('_')[0]
-        params = {
-            'method': 'trade',
-            'timestamp': int(time.time() * 1000),
-            'recvWindow': 5000,
-            'pair': pair,
-            'type': 'buy',
-            'price': '100000',
-            'order_type': 'limit'
-        }
-        
-        if base_currency == 'btc':
-            params['btc'] = '0.00001'
-        elif base_currency == 'eth':
-            params['eth'] = '0.00001'
-
-        signature = self._generate_signature(params)
-        headers = {
-            'Key': self.api_key,
-            'Sign': signature
-        }
-
-        request_timestamp = datetime.now()
-        start_time = time.time()
-        try:
-            async with session.post(self.base_url, headers=headers, data=params) as response:
-                result = await response.json()
-                end_time = time.time()
-                return {
-                    'request_id': request_id,
-                    'pair': pair,
-                    'status': response.status,
-                    'response': result,
-                    'time': end_time - start_time,
-                    'timestamp': request_timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')
-                }
-        except Exception as e:
-            end_time = time.time()
-            return {
-                'request_id': request_id,
-                'pair': pair,
-                'status': 'error',
-                'response': str(e),
-                'time': end_time - start_time,
-                'timestamp': request_timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')
-            }
-
-    async def run_test(self, pair, num_requests, initial_delay=0.060):
-        async with aiohttp.ClientSession() as session:
-            results = []
-            backoff = initial_delay
-            consecutive_errors = 0
-
-            print(f"Starting single pair test for {pair} at {datetime.now()}")
-            print(f"Initial delay: {initial_delay}s")
-            print("-" * 50)
-
-            for i in range(num_requests):
-                result = await self.send_trade_request(session, pair, i)
-                results.append(result)
-
-                # Print real-time feedback
-                print(f"Request {i} at {result['timestamp']}: Status {result['status']}")
-                if isinstance(result['response'], dict):
-                    error = result['response'].get('error_code')
-                    if error:
-                        print(f"Error: {error}")
-                        consecutive_errors += 1
-                        # Increase backoff if we hit rate limits
-                        if error == 'too_many_requests_from_your_ip':
-                            backoff = min(backoff * 2, 5.0)  # Double backoff up to 5 seconds
-                            print(f"Rate limit hit. Increasing delay to {backoff}s")
-                    else:
-                        consecutive_errors = 0
-                        # Gradually reduce backoff if successful
-                        backoff = max(initial_delay, backoff / 1.5)
-                
-                if i < num_requests - 1:  # Don't sleep after the last request
-                    print(f"Sleeping for {backoff}s...")
-                    print("-" * 30)
-                    await asyncio.sleep(backoff)
-
-            return results
+        body_fmt = f"method=trade&recvWindow=5000&pair={pair}&type=buy&price=100000&order_type=limit"
+
+        if base_currency in ('btc', 'eth'):
+            body_fmt += f"&{base_currency}=0.00001"
+        return body_fmt + "&timestamp={ts}"
+
+    async def run_test(self, session, pair, num_requests, initial_delay=0.060):
+        results = []
+        loop = asyncio.get_running_loop()
+
+        print(f"Starting single pair test for {pair} at {datetime.now()}")
+        print(f"Initial delay: {initial_delay}s")
+        print("-" * 50)
+
+        await warm_up(session, self.base_url)
+
+        for i in range(num_requests):
+            result = await self.send_trade_request(session, pair, i)
+            results.append(result)
+            queue_result(self._results_queue, result)
+
+            # Print real-time feedback
+            print(f"Request {i} at {format_wall_ns(result['t_wall_start'])}: Status {result['status']}")
+            if isinstance(result['response'], dict):
+                error = result['response'].get('error_code')
+                if error:
+                    print(f"Error: {error}")
+
+            if i < num_requests - 1:  # Don't sleep after the last request
+                # Wait out any hold-off the server asked for, otherwise keep the initial delay
+                delay = max(initial_delay, self._next_allowed.get(pair, 0) - loop.time())
+                if delay > initial_delay:
+                    print(f"Rate limit hit. Holding off for {delay:.3f}s")
+                print(f"Sleeping for {delay:.3f}s...")
+                print("-" * 30)
+                await asyncio.sleep(delay)
+
+        return results
 
 async def main():
     # Replace with your API credentials
@@ -112,37 +60,53 @@ async def main():
     num_requests = 120  # Number of requests to send
     initial_delay = 0.060  # 60ms initial delay
 
-    tester = IndodaxSinglePairTester(api_key, secret_key)
-    results = await tester.run_test(pair, num_requests, initial_delay)
+    # Results are streamed to disk as they complete
+    results_file = results_path('single_pair_test')
+    writer_q = asyncio.Queue()
+    writer_task = asyncio.create_task(write_results(writer_q, results_file))
+
+    tester = IndodaxSinglePairTester(api_key, secret_key, results_queue=writer_q)
+    try:
+        async with make_session() as session:
+            results = await tester.run_test(session, pair, num_requests, initial_delay)
+    finally:
+        await writer_q.put(None)
+        await writer_task
+    print(f"Results written to {results_file}")
 
     # Final analysis
     print("\nTest Summary:")
     print("-" * 50)
-    success = len([r for r in results if isinstance(r['status'], int) and r['status'] == 200])
+    # Count successes and tally error codes in a single pass
+    success = 0
+    error_types = {}
+    for r in results:
+        if isinstance(r['status'], int) and r['status'] == 200:
+            success += 1
+        if isinstance(r['response'], dict) and 'error_code' in r['response']:
+            error_code = r['response']['error_code']
+            error_types[error_code] = error_types.get(error_code, 0) + 1
     errors = len(results) - success
     
     print(f"Total requests: {len(results)}")
     print(f"Successful requests: {success}")
     print(f"Failed requests: {errors}")
     
-    # Calculate average time between requests
-    timestamps = [datetime.strptime(r['timestamp'], '%Y-%m-%d %H:%M:%S.%f') for r in results]
-    if len(timestamps) > 1:
-        intervals = [(timestamps[i+1] - timestamps[i]).total_seconds() for i in range(len(timestamps)-1)]
-        avg_interval = sum(intervals) / len(intervals)
+    # Average time between requests (the intervals telescope to last - first)
+    if len(results) > 1:
+        avg_interval = (results[-1]['t_start'] - results[0]['t_start']) / 1e9 / (len(results) - 1)
         print(f"\nAverage interval between requests: {avg_interval:.3f}s")
 
     # Show error distribution
-    error_types = {}
-    for r in results:
-        if isinstance(r['response'], dict) and 'error_code' in r['response']:
-            error_code = r['response']['error_code']
-            error_types[error_code] = error_types.get(error_code, 0) + 1
-    
     if error_types:
         print("\nError distribution:")
         for error_code, count in error_types.items():
             print(f"{error_code}: {count} times")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    if sys.platform.startswith('win'):
+        asyncio.run(main())
+    else:
+        # uvloop trims event loop overhead between the serial requests
+        import uvloop
+        uvloop.run(main()) 
\ No newline at end of file
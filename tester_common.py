@@ -0,0 +1,311 @@
+import hmac
+import time
+import random
+import hashlib
+import asyncio
+import heapq
+import aiohttp
+import orjson
+from datetime import datetime
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Seconds to hold off after a rate limit response that carries no headers
+RATE_LIMIT_COOLDOWN = 5.0
+# Upper bound on any hold-off, so a bogus header can't stall the test
+MAX_HOLD_OFF = 60.0
+
+# Connection failures and 5xx responses are retried this many times in total
+# before the request is recorded as an error. Only errors raised before the
+# request reached the server are retried: a read timeout may mean the order
+# was already accepted, and resending it could place a duplicate
+MAX_ATTEMPTS = 4
+RETRYABLE_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+
+def retry_delay(attempt):
+    # Exponential backoff with jitter, capped at one second
+    return min(0.05 * 2 ** attempt, 1.0) + random.random() * 0.05
+
+def format_wall_ns(wall_ns):
+    # Timestamps are kept as raw nanoseconds on the hot path and only
+    # formatted when printing
+    return datetime.fromtimestamp(wall_ns / 1e9).strftime(TIMESTAMP_FORMAT)
+
+def make_session():
+    # One session (and connection pool) for the whole test, so every request
+    # after the first reuses a kept-alive connection
+    connector = aiohttp.TCPConnector(
+        limit=0,
+        limit_per_host=64,
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
+        force_close=False
+    )
+    # Fail stalled requests fast instead of waiting out aiohttp's 5 minute default
+    timeout = aiohttp.ClientTimeout(total=2.0, sock_connect=0.5, sock_read=1.5)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        # Responses are tiny JSON blobs, so skip compression negotiation
+        # and the default User-Agent header on every request
+        headers={'Accept-Encoding': 'identity', 'Connection': 'keep-alive'},
+        skip_auto_headers=('User-Agent',),
+        auto_decompress=False
+    )
+
+async def warm_up(session, base_url):
+    # Open a pooled connection (TCP + TLS) up front so the first timed
+    # request doesn't pay the handshake cost
+    try:
+        async with session.get(base_url.replace('/tapi', ''),
+                               timeout=aiohttp.ClientTimeout(total=2.0)) as response:
+            await response.read()
+    except Exception:
+        pass
+
+def decode_response(raw):
+    # Proxies and CDNs answer rate limits and outages with HTML, so keep the
+    # raw text rather than failing the whole request on a decode error
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return raw.decode('utf-8', 'replace')
+
+def header_hold_off(response):
+    # Seconds the server wants us to wait according to its rate limit headers
+    # (or a bare 429), or None. Only looks at the status line and headers, so
+    # it works even when the body is an HTML error page or never arrives
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    if response.headers.get('X-RateLimit-Remaining') == '0':
+        try:
+            reset = float(response.headers.get('X-RateLimit-Reset'))
+            # Accept an epoch timestamp in milliseconds or seconds, or a
+            # number of seconds
+            if reset > 1e12:
+                return reset / 1000 - time.time()
+            if reset > 1e9:
+                return reset - time.time()
+            return reset
+        except (TypeError, ValueError):
+            pass
+    if response.status == 429:
+        return RATE_LIMIT_COOLDOWN
+    return None
+
+def body_hold_off(result):
+    # Fall back to the documented 5s cool-down when the limit is only
+    # reported in the JSON body
+    if isinstance(result, dict):
+        error = str(result.get('error', '')).lower()
+        if (result.get('error_code') == 'too_many_requests_from_your_ip'
+                or 'try again in 5 seconds' in error):
+            return RATE_LIMIT_COOLDOWN
+    return None
+
+def hold_off(next_allowed, pair, wait):
+    # Push back the earliest loop time the next request for this pair may go out
+    if wait is not None and wait > 0:
+        allowed_at = asyncio.get_running_loop().time() + min(wait, MAX_HOLD_OFF)
+        next_allowed[pair] = max(next_allowed.get(pair, 0), allowed_at)
+
+def results_path(script):
+    # One file per script and run, so a new run never overwrites earlier output
+    return f"results_{script}_{datetime.now():%Y%m%d_%H%M%S}.jsonl"
+
+def queue_result(queue, result):
+    # Hand a finished result to write_results(), if results are being streamed
+    if queue is not None:
+        queue.put_nowait(orjson.dumps(result) + b'\n')
+
+async def write_results(queue, path):
+    # Single consumer that appends each result to a JSON lines file as it
+    # completes; a None on the queue ends the stream
+    with open(path, 'wb') as f:
+        while True:
+            line = await queue.get()
+            if line is None:
+                break
+            f.write(line)
+            # Flush whenever we catch up so the file can be tailed mid-run
+            if queue.empty():
+                f.flush()
+
+# Signing, retry and pacing shared by the trade endpoint testers. Subclasses
+# set base_url and implement _make_body_fmt; _build_row and _error_status can
+# be overridden to shape the result rows
+class IndodaxTradeTester:
+    base_url = "https://btcapi.net/tapi"
+
+    def __init__(self, api_key, secret_key, max_in_flight=32, results_queue=None):
+        self.api_key = api_key
+        self.secret_key = secret_key.encode()
+        # Cap in-flight requests so a slow server can't pile up enough
+        # connections to exhaust the connector
+        self._sem = asyncio.Semaphore(max_in_flight)
+        self._hmac_proto = hmac.new(self.secret_key, b'', hashlib.sha512)
+        self._body_fmt = {}
+        # Earliest loop time at which the next request for each pair may go out
+        self._next_allowed = {}
+        # Optional queue drained by write_results()
+        self._results_queue = results_queue
+
+    def _generate_signature(self, body):
+        # Copying the keyed prototype skips re-deriving the HMAC key pads
+        signature = self._hmac_proto.copy()
+        signature.update(body)
+        return signature.hexdigest()
+
+    def _make_body_fmt(self, pair):
+        # Format string for the trade body of a pair, with {ts} (and optionally
+        # {request_id}) left as placeholders
+        raise NotImplementedError
+
+    def _get_body_fmt(self, pair):
+        # The body has a fixed schema of ASCII keys and values that need no
+        # quoting, so it is formatted directly instead of going through
+        # urlencode, and the per-pair part is only built once
+        body_fmt = self._body_fmt.get(pair)
+        if body_fmt is None:
+            body_fmt = self._body_fmt[pair] = self._make_body_fmt(pair)
+        return body_fmt
+
+    def _signed_request(self, pair, request_id):
+        # Build and sign a body with a fresh timestamp; called for every
+        # attempt so retries never go out with a stale timestamp
+        body = self._get_body_fmt(pair).format(
+            ts=time.time_ns() // 1_000_000, request_id=request_id).encode()
+        headers = {
+            'Key': self.api_key,
+            'Sign': self._generate_signature(body),
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        return headers, body
+
+    def _build_row(self, row, response, result, wait):
+        # Hook for testers that record extra columns; response and result are
+        # None when the request failed without a response
+        return row
+
+    def _error_status(self, exc):
+        return 'error'
+
+    async def send_trade_request(self, session, pair, request_id):
+        async with self._sem:
+            # Start the clock (and sign, below) only once we hold a slot, so
+            # time queued behind the semaphore isn't counted as server latency
+            t_start = time.monotonic_ns()
+            t_wall_start = time.time_ns()
+            for attempt in range(MAX_ATTEMPTS):
+                if attempt:
+                    await asyncio.sleep(retry_delay(attempt - 1))
+                last_attempt = attempt == MAX_ATTEMPTS - 1
+                headers, body = self._signed_request(pair, request_id)
+                try:
+                    async with session.post(self.base_url, headers=headers, data=body) as response:
+                        wait = header_hold_off(response)
+                        hold_off(self._next_allowed, pair, wait)
+                        # A 5xx that carries a hold-off is recorded rather than
+                        # retried, so the pacer can honour the server's wait
+                        if response.status >= 500 and wait is None and not last_attempt:
+                            continue
+                        result = decode_response(await response.read())
+                        t_end = time.monotonic_ns()
+                        if wait is None:
+                            hold_off(self._next_allowed, pair, body_hold_off(result))
+                        return self._build_row({
+                            'request_id': request_id,
+                            'pair': pair,
+                            'status': response.status,
+                            'response': result,
+                            'time': (t_end - t_start) / 1e9,
+                            't_start': t_start,
+                            't_end': t_end,
+                            't_wall_start': t_wall_start,
+                            'retried': attempt
+                        }, response, result, wait)
+                except Exception as e:
+                    if isinstance(e, RETRYABLE_ERRORS) and not last_attempt:
+                        continue
+                    t_end = time.monotonic_ns()
+                    return self._build_row({
+                        'request_id': request_id,
+                        'pair': pair,
+                        'status': self._error_status(e),
+                        'response': str(e),
+                        'time': (t_end - t_start) / 1e9,
+                        't_start': t_start,
+                        't_end': t_end,
+                        't_wall_start': t_wall_start,
+                        'retried': attempt
+                    }, None, None, None)
+
+    def _exception_result(self, pair, request_id, t_start, t_wall_start, exc):
+        # Errors normally come back as result rows; this covers anything that
+        # escaped send_trade_request (e.g. cancellation). Times are taken from
+        # dispatch, and since the failure is only seen once the batch is
+        # gathered, 'time' is an upper bound
+        t_end = time.monotonic_ns()
+        return self._build_row({
+            'request_id': request_id,
+            'pair': pair,
+            'status': 'error',
+            'response': repr(exc),
+            'time': (t_end - t_start) / 1e9,
+            't_start': t_start,
+            't_end': t_end,
+            't_wall_start': t_wall_start,
+            'retried': 0
+        }, None, None, None)
+
+    def _record_result(self, task):
+        # Stream each finished request as it completes; requests that ended in
+        # an exception are written by _dispatch once they've been converted
+        if not task.cancelled() and task.exception() is None:
+            queue_result(self._results_queue, task.result())
+
+    async def _dispatch(self, session, pairs, requests_per_pair):
+        # One pacer for every pair: each pair keeps its own 60ms cadence, but
+        # dispatches are interleaved in deadline order and pair start times are
+        # staggered across the interval, so pairs don't fire in lockstep bursts
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        start_ids = {pair: i * requests_per_pair for i, pair in enumerate(pairs)}
+        heap = [(t0 + i * 0.060 / len(pairs), pair, 0) for i, pair in enumerate(pairs)]
+        heapq.heapify(heap)
+
+        tasks = []
+        dispatched = []
+        while heap:
+            deadline, pair, i = heapq.heappop(heap)
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # Checked after waking, since a hold-off can arrive while we sleep
+            next_allowed = self._next_allowed.get(pair, 0)
+            if next_allowed > deadline:
+                # The server asked us to hold off on this pair; requeue it
+                # without blocking the other pairs
+                heapq.heappush(heap, (next_allowed, pair, i))
+                continue
+            request_id = start_ids[pair] + i
+            task = asyncio.create_task(
+                self.send_trade_request(session, pair, request_id)
+            )
+            task.add_done_callback(self._record_result)
+            tasks.append(task)
+            dispatched.append((pair, request_id, time.monotonic_ns(), time.time_ns()))
+            if i + 1 < requests_per_pair:
+                heapq.heappush(heap, (deadline + 0.060, pair, i + 1))
+
+        # return_exceptions keeps one failing request from cancelling its siblings
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for n, ((pair, request_id, t_start, t_wall_start), result) in enumerate(zip(dispatched, results)):
+            if isinstance(result, BaseException):
+                results[n] = self._exception_result(pair, request_id, t_start, t_wall_start, result)
+                queue_result(self._results_queue, results[n])
+        return results